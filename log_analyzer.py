@@ -0,0 +1,402 @@
+import argparse
+import re
+import socket
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+LOG_FILE = "server_stats.txt"
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Formati i rreshtave: "2025-11-16 23:22:59 - NEW CLIENT - ('127.0.0.1', 53012)"
+LINE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - (.*)$")
+EVENT_PATTERNS = [
+    ('SERVER STARTED', re.compile(r"^SERVER STARTED\b")),
+    ('SERVER STOPPED', re.compile(r"^SERVER STOPPED\b")),
+    ('NEW CLIENT', re.compile(r"^NEW CLIENT - (?P<addr>\(.*?\))$")),
+    ('ADMIN LOGIN', re.compile(r"^ADMIN LOGIN - (?P<addr>\(.*?\)) as (?P<user>.*)$")),
+    ('FAILED LOGIN', re.compile(r"^FAILED LOGIN - (?P<addr>\(.*?\))")),
+    ('FILE UPLOAD', re.compile(r"^FILE UPLOAD - (?P<addr>\(.*?\)) uploaded (?P<file>.*)$")),
+    ('FILE DOWNLOAD', re.compile(r"^FILE DOWNLOAD - (?P<addr>\(.*?\)) downloaded (?P<file>.*)$")),
+    ('FILE DELETE', re.compile(r"^FILE DELETE - (?P<addr>\(.*?\)) deleted (?P<file>.*)$")),
+    ('CLIENT TIMEOUT', re.compile(r"^CLIENT TIMEOUT - (?P<addr>\(.*?\))$")),
+]
+
+
+def parse_line(line):
+    """Kthen (timestamp, event, fields) ose None për rreshta të panjohur"""
+    match = LINE_RE.match(line.rstrip('\r\n'))
+    if not match:
+        return None
+
+    try:
+        timestamp = datetime.strptime(match.group(1), TIME_FORMAT)
+    except ValueError:
+        return None
+
+    body = match.group(2)
+    for event, pattern in EVENT_PATTERNS:
+        event_match = pattern.match(body)
+        if event_match:
+            return timestamp, event, event_match.groupdict()
+
+    # Eventet e tjera (STATS, MANUAL STATS, ...) ruhen me emrin e parë
+    return timestamp, body.split(' - ', 1)[0], {}
+
+
+def iter_events(path=LOG_FILE, on_unparsed=None):
+    """Lexon log-un rresht pas rreshti pa e ngarkuar të gjithin në memorie"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parsed = parse_line(line)
+            if parsed is not None:
+                yield parsed
+            elif on_unparsed is not None and line.strip():
+                on_unparsed(line)
+
+
+class LogAnalyzer:
+    def __init__(self):
+        self.total_events = 0
+        self.unparsed_lines = 0
+        self.first_event = None
+        self.last_event = None
+        self.event_counts = Counter()
+        self.client_stats = defaultdict(lambda: {
+            'sessions': 0,
+            'timeouts': 0,
+            'uploads': 0,
+            'downloads': 0,
+            'deletes': 0,
+            'usernames': set(),
+            'closed_sessions': 0,
+            'session_total': 0.0,
+            'session_max': 0.0,
+        })
+        self.file_stats = defaultdict(Counter)
+        self.hourly_stats = defaultdict(Counter)
+        # Sesionet e hapura: addr -> koha e NEW CLIENT
+        self.open_sessions = {}
+        self.session_count = 0
+        self.session_total = 0.0
+        self.session_min = None
+        self.session_max = 0.0
+        self.unclosed_sessions = 0
+        # Sesionet e hapura në momentin e SERVER STARTED, derisa të shihet nëse vjen STATE RESTORED
+        self.restart_sessions = None
+
+    def process_file(self, path=LOG_FILE):
+        for timestamp, event, fields in iter_events(path, on_unparsed=self.count_unparsed):
+            self.process_event(timestamp, event, fields)
+        self.finish()
+        return self
+
+    def count_unparsed(self, line):
+        self.unparsed_lines += 1
+
+    def process_event(self, timestamp, event, fields):
+        self.total_events += 1
+        if self.first_event is None:
+            self.first_event = timestamp
+        self.last_event = timestamp
+        self.event_counts[event] += 1
+        self.hourly_stats[timestamp.strftime('%Y-%m-%d %H:00')][event] += 1
+
+        addr = fields.get('addr')
+        filename = fields.get('file')
+
+        if self.restart_sessions is not None:
+            # Pas warm restart (STATE RESTORED) sesionet vazhdojnë, përndryshe mbyllen pa timeout
+            if event == 'STATE RESTORED':
+                self.open_sessions.update(self.restart_sessions)
+            else:
+                self.unclosed_sessions += len(self.restart_sessions)
+            self.restart_sessions = None
+
+        if event == 'SERVER STARTED':
+            self.restart_sessions = dict(self.open_sessions)
+            self.open_sessions.clear()
+        elif event == 'NEW CLIENT':
+            if addr in self.open_sessions:
+                self.unclosed_sessions += 1
+            self.open_sessions[addr] = timestamp
+            self.client_stats[addr]['sessions'] += 1
+        elif event == 'ADMIN LOGIN':
+            self.client_stats[addr]['usernames'].add(fields['user'])
+        elif event == 'FILE UPLOAD':
+            self.client_stats[addr]['uploads'] += 1
+            self.file_stats[filename]['uploads'] += 1
+        elif event == 'FILE DOWNLOAD':
+            self.client_stats[addr]['downloads'] += 1
+            self.file_stats[filename]['downloads'] += 1
+        elif event == 'FILE DELETE':
+            self.client_stats[addr]['deletes'] += 1
+            self.file_stats[filename]['deletes'] += 1
+        elif event == 'CLIENT TIMEOUT':
+            self.client_stats[addr]['timeouts'] += 1
+            started = self.open_sessions.pop(addr, None)
+            if started is not None:
+                self.record_session(addr, (timestamp - started).total_seconds())
+
+    def record_session(self, addr, length):
+        client = self.client_stats[addr]
+        client['closed_sessions'] += 1
+        client['session_total'] += length
+        client['session_max'] = max(client['session_max'], length)
+
+        self.session_count += 1
+        self.session_total += length
+        self.session_max = max(self.session_max, length)
+        if self.session_min is None or length < self.session_min:
+            self.session_min = length
+
+    def finish(self):
+        if self.restart_sessions is not None:
+            self.unclosed_sessions += len(self.restart_sessions)
+            self.restart_sessions = None
+        self.unclosed_sessions += len(self.open_sessions)
+        self.open_sessions.clear()
+
+    def top_downloads(self, limit=5):
+        ranked = sorted(self.file_stats.items(), key=lambda item: item[1]['downloads'], reverse=True)
+        return [(name, stats['downloads']) for name, stats in ranked[:limit] if stats['downloads']]
+
+    def report(self, top=5):
+        lines = ["ANALIZA E LOG-UT"]
+        if self.first_event is None:
+            lines.append("(Asnjë event)")
+            return "\n".join(lines)
+
+        lines.append(f"Periudha: {self.first_event.strftime(TIME_FORMAT)} - {self.last_event.strftime(TIME_FORMAT)}")
+        lines.append(f"Total evente: {self.total_events} (rreshta të panjohur: {self.unparsed_lines})")
+        for event, count in self.event_counts.most_common():
+            lines.append(f"  {event}: {count}")
+
+        lines.append("\nSesionet:")
+        if self.session_count:
+            average = self.session_total / self.session_count
+            lines.append(f"  Të mbyllura: {self.session_count}, mesatarja: {average:.1f}s, "
+                         f"min: {self.session_min:.0f}s, max: {self.session_max:.0f}s")
+        else:
+            lines.append("  Të mbyllura: 0")
+        lines.append(f"  Pa timeout (restart/fund i log-ut): {self.unclosed_sessions}")
+
+        lines.append("\nKlientët:")
+        for addr, stats in sorted(self.client_stats.items()):
+            closed = stats['closed_sessions']
+            average = stats['session_total'] / closed if closed else 0.0
+            users = ", ".join(sorted(stats['usernames'])) or "-"
+            lines.append(f"- {addr} [{users}]: {stats['sessions']} sesione, {stats['timeouts']} timeout, "
+                         f"mesatarja {average:.1f}s, max {stats['session_max']:.0f}s, "
+                         f"{stats['uploads']} upload, {stats['downloads']} download, {stats['deletes']} delete")
+
+        lines.append("\nFile-t:")
+        for name, stats in sorted(self.file_stats.items()):
+            lines.append(f"- {name}: {stats['uploads']} upload, {stats['downloads']} download, "
+                         f"{stats['deletes']} delete")
+
+        lines.append(f"\nTop {top} file të shkarkuara:")
+        downloads = self.top_downloads(top)
+        if downloads:
+            for name, count in downloads:
+                lines.append(f"  {name}: {count}")
+        else:
+            lines.append("  (Asnjë)")
+
+        lines.append("\nSipas orës:")
+        for hour, counts in sorted(self.hourly_stats.items()):
+            lines.append(f"- {hour}: {sum(counts.values())} evente, {counts['NEW CLIENT']} klientë të rinj, "
+                         f"{counts['CLIENT TIMEOUT']} timeout, {counts['FILE DOWNLOAD']} download, "
+                         f"{counts['FILE UPLOAD']} upload")
+
+        return "\n".join(lines)
+
+
+class LogReplayer:
+    """Riprodhon sekuencën e eventeve të log-ut kundër një UDPServer lokal
+
+    Replay dërgon komanda të vërteta (UPLOAD, /delete), prandaj emrat e file-ve
+    marrin prefix-in file_prefix ('replay_') dhe nuk prekin file-t ekzistuese.
+    Me file_prefix='' serveri duhet të punojë në një direktori pune të veçantë.
+
+    Serveri e mban një klient deri në timeout-in e vet (30s), prandaj socket-at
+    e klientëve që bënë timeout nuk mbyllen por ripërdoren. Kështu numri i
+    klientëve të gjallë nuk e kalon max_clients (max_connections i serverit).
+    Një socket i ripërdorur mund të mbajë ende statusin admin të klientit të
+    mëparshëm. Në replay të përshpejtuar serveri nuk arrin të bëjë timeout,
+    kështu që NEW CLIENT/CLIENT TIMEOUT nuk përsëriten; për ta ruajtur këtë
+    churn përdor speed=1 me max_gap pak mbi timeout-in e serverit (p.sh. 35).
+    """
+
+    def __init__(self, server_host='127.0.0.1', server_port=5678, speed=1.0,
+                 admin_password='admin123', max_gap=None, max_clients=5,
+                 file_prefix='replay_'):
+        self.server_host = server_host
+        self.server_port = server_port
+        self.speed = speed
+        self.admin_password = admin_password
+        self.max_gap = max_gap
+        self.max_clients = max_clients
+        self.file_prefix = file_prefix
+        # Klienti i log-ut -> socket-i që e përfaqëson tani
+        self.sockets = {}
+        self.free_sockets = []
+        self.all_sockets = []
+        self.sent = 0
+        self.skipped = 0
+        self.replies = 0
+        self.errors = Counter()
+
+    def acquire_socket(self, addr):
+        sock = self.sockets.get(addr)
+        if sock is not None:
+            return sock
+
+        if self.free_sockets:
+            sock = self.free_sockets.pop()
+        elif len(self.all_sockets) < self.max_clients:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            self.all_sockets.append(sock)
+        else:
+            return None
+
+        self.sockets[addr] = sock
+        return sock
+
+    def release_socket(self, addr):
+        sock = self.sockets.pop(addr, None)
+        if sock is not None:
+            self.free_sockets.append(sock)
+
+    def send(self, addr, message):
+        sock = self.acquire_socket(addr)
+        if sock is None:
+            # Më shumë klientë të gjallë se max_clients, serveri do të kthente "Server full"
+            self.skipped += 1
+            return
+
+        sock.sendto(message.encode('utf-8'), (self.server_host, self.server_port))
+        self.sent += 1
+        self.drain(sock)
+
+    def drain(self, sock):
+        # Lexo përgjigjet që kanë ardhur dhe numëro gabimet e serverit
+        while True:
+            try:
+                data, _ = sock.recvfrom(65536)
+            except (BlockingIOError, OSError):
+                return
+
+            self.replies += 1
+            reply = data.decode('utf-8', errors='replace')
+            if reply.startswith('ERROR'):
+                self.errors[reply.split('\n', 1)[0]] += 1
+
+    def messages_for(self, event, fields):
+        filename = self.file_prefix + fields['file'] if 'file' in fields else None
+        if event == 'NEW CLIENT':
+            return ["Ping"]
+        if event == 'ADMIN LOGIN':
+            return [f"LOGIN_ADMIN:{fields['user']}:{self.admin_password}"]
+        if event == 'FAILED LOGIN':
+            return ["LOGIN_ADMIN:replay:"]
+        if event == 'FILE UPLOAD':
+            return [f"/upload {filename}", f"UPLOAD:{filename}:replay"]
+        if event == 'FILE DOWNLOAD':
+            return [f"/download {filename}"]
+        if event == 'FILE DELETE':
+            return [f"/delete {filename}"]
+        return []
+
+    def replay(self, path=LOG_FILE):
+        previous = None
+        restarted = False
+        started = time.time()
+
+        try:
+            for timestamp, event, fields in iter_events(path):
+                if previous is not None and self.speed > 0:
+                    gap = max(0.0, (timestamp - previous).total_seconds())
+                    if self.max_gap is not None:
+                        gap = min(gap, self.max_gap)
+                    if gap:
+                        time.sleep(gap / self.speed)
+                previous = timestamp
+
+                addr = fields.get('addr')
+                if restarted:
+                    # Pas warm restart (STATE RESTORED) klientët vazhdojnë me të njëjtin socket
+                    restarted = False
+                    if event != 'STATE RESTORED':
+                        for old_addr in list(self.sockets):
+                            self.release_socket(old_addr)
+                if event == 'CLIENT TIMEOUT':
+                    self.release_socket(addr)
+                    continue
+                if event == 'SERVER STARTED':
+                    restarted = True
+                    continue
+
+                for message in self.messages_for(event, fields):
+                    try:
+                        self.send(addr, message)
+                    except Exception as e:
+                        print(f"Gabim në dërgim për {addr}: {e}")
+
+            # Prit pak për përgjigjet e fundit
+            time.sleep(0.5)
+            for sock in self.all_sockets:
+                self.drain(sock)
+        finally:
+            for sock in self.all_sockets:
+                sock.close()
+            self.all_sockets = []
+            self.free_sockets = []
+            self.sockets.clear()
+
+        elapsed = time.time() - started
+        print(f"Replay përfundoi: {self.sent} mesazhe në {elapsed:.2f} sekonda, "
+              f"{self.replies} përgjigje, {self.skipped} të anashkaluara (mbi max_clients)")
+        if self.errors:
+            print("Gabimet e serverit:")
+            for error, count in self.errors.most_common():
+                print(f"  {error}: {count}")
+        return self.sent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analizë dhe replay i server_stats.txt",
+        epilog="Replay ripërdor socket-at e klientëve, prandaj me --speed të lartë serveri nuk bën "
+               "timeout dhe NEW CLIENT/CLIENT TIMEOUT nuk përsëriten. Për të ruajtur churn-in përdor "
+               "--speed 1 --max-gap 35 (pak mbi timeout-in 30s të serverit). Download-et e file-ve "
+               "që nuk u ngarkuan gjatë replay kthejnë ERROR, përveç nëse ekziston kopja me prefix.")
+    parser.add_argument('path', nargs='?', default=LOG_FILE, help="File-i i log-ut")
+    parser.add_argument('--top', type=int, default=5, help="Sa file të shfaqen në top download")
+    parser.add_argument('--replay', action='store_true', help="Riprodho eventet kundër serverit")
+    parser.add_argument('--host', default='127.0.0.1', help="IP e serverit për replay")
+    parser.add_argument('--port', type=int, default=5678, help="Porti i serverit për replay")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Faktori i shpejtësisë (1 = koha reale, 0 = pa pauza)")
+    parser.add_argument('--max-gap', type=float, default=None,
+                        help="Pauza maksimale (sekonda log-u) mes dy eventeve")
+    parser.add_argument('--password', default='admin123', help="Fjalëkalimi i admin për replay")
+    parser.add_argument('--max-clients', type=int, default=5,
+                        help="Klientë të gjallë njëkohësisht (max_connections i serverit)")
+    parser.add_argument('--prefix', default='replay_',
+                        help="Prefix për emrat e file-ve në replay ('' vetëm me server në direktori të veçantë)")
+    args = parser.parse_args()
+
+    if args.replay:
+        replayer = LogReplayer(args.host, args.port, speed=args.speed,
+                               admin_password=args.password, max_gap=args.max_gap,
+                               max_clients=args.max_clients, file_prefix=args.prefix)
+        replayer.replay(args.path)
+    else:
+        analyzer = LogAnalyzer().process_file(args.path)
+        print(analyzer.report(top=args.top))
+
+
+if __name__ == "__main__":
+    main()
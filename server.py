@@ -2,15 +2,25 @@ import socket
 import threading
 import time
 import os
+import queue
+import tempfile
+import json
 from datetime import datetime
 from collections import defaultdict
 import logging
 
 FILES_DIR = "Files"
+UPLOAD_TMP_PREFIX = ".upload_"
+DURABILITY_POLICIES = ('none', 'batch', 'always')
+UPLOAD_WAIT_TIMEOUT = 5  # sekonda
+STATE_FILE = "server_state.json"
+STATE_VERSION = 2
 
 
 class UDPServer:
-    def __init__(self, host='0.0.0.0', port=5678, max_connections=5):
+    def __init__(self, host='0.0.0.0', port=5678, max_connections=5,
+                 durability='batch', flush_interval=0.05, max_batch=64,
+                 state_file=STATE_FILE, snapshot_interval=10):
         self.host = host
         self.port = port
         self.max_connections = max_connections
@@ -29,13 +39,35 @@ class UDPServer:
         self.last_activity = {}
         self.timeout = 30  # 30 sekonda timeout
 
+        # Upload-et ruhen në background (write-behind):
+        # 'none' - pa fsync, 'batch' - fsync i të gjithë batch-it para publikimit,
+        # 'always' - përgjigja dërgohet vetëm pasi file-i është në disk
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(f"Politikë e panjohur: {durability}")
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending_uploads = {}  # filename -> përmbajtja që ende nuk është në disk
+        self.upload_events = {}  # filename -> Event që vendoset kur file-i del nga pending
+        self.upload_waiters = {}  # filename -> [(addr, done, result)] që presin publikimin
+        self.upload_lock = threading.Lock()
+        self.upload_queue = queue.Queue()
+
         # Krijo folderin Files nëse nuk ekziston
         if not os.path.exists(FILES_DIR):
             os.makedirs(FILES_DIR)
+        self.cleanup_staged_uploads()
 
         # Konfigurimi i logging për server_stats.txt
         self.setup_logging()
 
+        # Warm restart: sesionet dhe statistikat ruhen periodikisht në state_file
+        self.state_file = state_file
+        self.snapshot_interval = snapshot_interval
+        self.last_snapshot = None
+        self.snapshot_age = None
+        self.restored_clients = self.load_state()
+
     def setup_logging(self):
         """Setup logging për server_stats.txt"""
         self.logger = logging.getLogger('server_stats')
@@ -57,9 +89,16 @@ class UDPServer:
 
             # Regjistro fillimin e serverit
             self.logger.info(f"SERVER STARTED - Host: {self.host}, Port: {self.port}")
+            if self.restored_clients:
+                print(f"U rikthyen {self.restored_clients} sesione nga {self.state_file} "
+                      f"(snapshot {self.snapshot_age:.1f}s i vjetër)")
+                self.logger.info(f"STATE RESTORED - {self.restored_clients} clients")
 
             # Nis thread-et
             threading.Thread(target=self.monitor_connections, daemon=True).start()
+            threading.Thread(target=self.upload_writer, daemon=True).start()
+            if self.state_file:
+                threading.Thread(target=self.snapshot_loop, daemon=True).start()
             threading.Thread(target=self.handle_commands, daemon=True).start()
 
             while self.running:
@@ -74,6 +113,8 @@ class UDPServer:
             print(f"Gabim në start: {e}")
         finally:
             self.socket.close()
+            self.flush_uploads(timeout=UPLOAD_WAIT_TIMEOUT)
+            self.save_state()
             self.logger.info("SERVER STOPPED")
 
     def handle_request(self, data, addr):
@@ -192,24 +233,246 @@ class UDPServer:
             filename = parts[1]
             content = parts[2]
 
-            # Ruaj file në folderin Files
-            filepath = os.path.join(FILES_DIR, filename)
+            error = self.validate_upload_name(filename)
+            if error:
+                self.send_response(addr, f"ERROR upload: {error}")
+                return
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Përmbajtja mbahet në memorie derisa writer-i ta publikojë në Files.
+            # FILE UPLOAD regjistrohet në log vetëm pasi file-i të jetë publikuar.
+            done = threading.Event() if self.durability == 'always' else None
+            result = {}
+            with self.upload_lock:
+                self.pending_uploads[filename] = content
+                self.upload_events.setdefault(filename, threading.Event())
+                self.upload_waiters.setdefault(filename, []).append((addr, done, result))
+            self.upload_queue.put(filename)
+
+            if done is not None:
+                if not done.wait(UPLOAD_WAIT_TIMEOUT):
+                    raise TimeoutError("File ende po ruhet në disk")
+                if 'error' in result:
+                    raise result['error']
 
             self.send_response(addr, f"OK: Upload sukses për {filename}")
-            self.logger.info(f"FILE UPLOAD - {addr} uploaded {filename}")
         except Exception as e:
             self.send_response(addr, f"ERROR upload: {e}")
 
+    def validate_upload_name(self, filename):
+        """Kthen mesazhin e gabimit nëse emri nuk mund të jetë file në Files"""
+        name = os.path.basename(filename)
+        if name in ('', '.', '..') or filename.endswith(('/', '\\')) or '\0' in filename:
+            return "Emër i pavlefshëm i file-it"
+        if name.startswith(UPLOAD_TMP_PREFIX):
+            return "Emri i file-it është i rezervuar"
+
+        filepath = os.path.join(FILES_DIR, filename)
+        base = os.path.realpath(FILES_DIR)
+        real = os.path.realpath(filepath)
+        try:
+            inside = os.path.commonpath([base, real]) == base and real != base
+        except ValueError:
+            # Disqe të ndryshme në Windows
+            inside = False
+        if not inside:
+            return "File duhet të jetë brenda Files"
+
+        directory = os.path.dirname(filepath)
+        if not os.path.isdir(directory):
+            return "Direktoria nuk ekziston"
+        if os.path.isdir(filepath):
+            return "Emri i përket një direktorie"
+
+        try:
+            name_max = os.pathconf(directory, 'PC_NAME_MAX')
+        except (AttributeError, ValueError, OSError):
+            name_max = 255
+        if len(name.encode('utf-8')) > name_max:
+            return "Emri i file-it është shumë i gjatë"
+        return None
+
+    def upload_writer(self):
+        """Shkruan upload-et në file të përkohshëm dhe i publikon me os.replace"""
+        while True:
+            batch = [self.upload_queue.get()]
+            # Mblidh upload-et që vijnë brenda flush_interval për një fsync të përbashkët
+            deadline = time.time() + (self.flush_interval if self.durability == 'batch' else 0)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.upload_queue.get(timeout=max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                print(f"Gabim në ruajtjen e upload-eve: {e}")
+                for filename in dict.fromkeys(batch):
+                    self.fail_upload(filename, None, e)
+            finally:
+                for _ in batch:
+                    self.upload_queue.task_done()
+
+    def write_batch(self, batch):
+        staged = []
+        try:
+            # Disa upload-e të të njëjtit file në batch shkruhen vetëm një herë
+            for filename in dict.fromkeys(batch):
+                content = self.get_pending_upload(filename)
+                if content is None:
+                    # U fshi ose u shkrua tashmë nga një batch i mëparshëm
+                    continue
+
+                item = None
+                try:
+                    filepath = os.path.join(FILES_DIR, filename)
+                    fd, tmp_path = tempfile.mkstemp(prefix=UPLOAD_TMP_PREFIX, dir=os.path.dirname(filepath))
+                    item = (filename, content, filepath, tmp_path, os.fdopen(fd, 'wb'))
+                    item[4].write(content.encode('utf-8'))
+                    item[4].flush()
+                    if self.durability == 'always':
+                        os.fsync(item[4].fileno())
+                    staged.append(item)
+                except Exception as e:
+                    if item is not None:
+                        self.discard_staged(item)
+                    self.fail_upload(filename, content, e)
+
+            if self.durability == 'batch':
+                staged = self.sync_staged(staged)
+
+            # File-t mbyllen para os.replace (Windows nuk lejon replace të file-ve të hapura)
+            for item in staged:
+                item[4].close()
+
+            directories = set()
+            for filename, content, filepath, tmp_path, _ in staged:
+                try:
+                    with self.upload_lock:
+                        # Publiko vetëm nëse nuk ka ardhur version më i ri apo delete në ndërkohë
+                        if self.pending_uploads.get(filename) is not content:
+                            continue
+                        os.replace(tmp_path, filepath)
+                        waiters = self.finish_pending(filename)
+                    directories.add(os.path.dirname(filepath))
+                    self.notify_uploaded(filename, waiters)
+                except Exception as e:
+                    self.fail_upload(filename, content, e)
+
+            if self.durability != 'none':
+                for directory in directories:
+                    self.fsync_directory(directory)
+        finally:
+            for item in staged:
+                self.discard_staged(item)
+
+    def sync_staged(self, staged):
+        """fsync i të gjithë file-ve të batch-it pasi të jenë shkruar, kthen ato që u ruajtën"""
+        synced = []
+        for item in staged:
+            filename, content, _, _, f = item
+            try:
+                os.fsync(f.fileno())
+                synced.append(item)
+            except Exception as e:
+                self.discard_staged(item)
+                self.fail_upload(filename, content, e)
+        return synced
+
+    def discard_staged(self, item):
+        _, _, _, tmp_path, f = item
+        if not f.closed:
+            f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def notify_uploaded(self, filename, waiters):
+        for addr, done, _ in waiters:
+            self.logger.info(f"FILE UPLOAD - {addr} uploaded {filename}")
+            if done is not None:
+                done.set()
+
+    def fail_upload(self, filename, content, error):
+        """Heq nga pending vetëm këtë version (content=None heq çdo version)"""
+        print(f"Gabim në ruajtjen e {filename}: {error}")
+        with self.upload_lock:
+            # Një version më i ri me të njëjtin emër do të njoftojë vetë klientët që presin
+            if content is not None and self.pending_uploads.get(filename) is not content:
+                return
+            waiters = self.finish_pending(filename)
+
+        for addr, done, result in waiters:
+            self.logger.info(f"FILE UPLOAD FAILED - {addr} {filename}: {error}")
+            result['error'] = error
+            if done is not None:
+                done.set()
+
+    def finish_pending(self, filename):
+        """Heq file-in nga pending dhe kthen klientët që prisnin (thirret me upload_lock)"""
+        self.pending_uploads.pop(filename, None)
+        event = self.upload_events.pop(filename, None)
+        if event is not None:
+            event.set()
+        return self.upload_waiters.pop(filename, [])
+
+    def fsync_directory(self, directory):
+        # Në Windows direktoritë nuk mund të hapen për fsync
+        try:
+            fd = os.open(directory or '.', os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def wait_for_upload(self, filename, timeout=UPLOAD_WAIT_TIMEOUT):
+        """Pret derisa upload-i i këtij file të shkruhet, kthen False pas timeout"""
+        with self.upload_lock:
+            event = self.upload_events.get(filename)
+        return event is None or event.wait(timeout)
+
+    def flush_uploads(self, timeout=None):
+        """Pret derisa të gjitha upload-et në pritje të shkruhen në disk"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.upload_lock:
+            events = list(self.upload_events.values())
+        for event in events:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            if not event.wait(remaining):
+                return False
+        return True
+
+    def get_pending_upload(self, filename):
+        with self.upload_lock:
+            return self.pending_uploads.get(filename)
+
+    def cleanup_staged_uploads(self):
+        # Fshi file-t e përkohshëm të mbetur nga një ndalim i papritur
+        for file in os.listdir(FILES_DIR):
+            if file.startswith(UPLOAD_TMP_PREFIX):
+                try:
+                    os.remove(os.path.join(FILES_DIR, file))
+                except OSError:
+                    pass
+
+    def visible_files(self, directory=FILES_DIR):
+        files = [file for file in os.listdir(directory) if not file.startswith(UPLOAD_TMP_PREFIX)]
+        if os.path.normpath(directory) == os.path.normpath(FILES_DIR):
+            with self.upload_lock:
+                pending = [file for file in self.pending_uploads if file not in files]
+            files.extend(pending)
+        return files
+
     def list_files(self, addr, directory):
         try:
             # Sigurohu që directory është brenda FILES_DIR për siguri
             if not directory.startswith(FILES_DIR):
                 directory = FILES_DIR
 
-            files = os.listdir(directory)
+            files = self.visible_files(directory)
             output = "\n".join(files) if files else "(Bosh)"
             self.send_response(addr, output)
         except Exception as e:
@@ -220,12 +483,14 @@ class UDPServer:
             # Sigurohu që file është brenda FILES_DIR
             filepath = os.path.join(FILES_DIR, filename)
 
-            if not os.path.exists(filepath):
-                self.send_response(addr, "ERROR: File nuk ekziston")
-                return
+            content = self.get_pending_upload(filename)
+            if content is None:
+                if not os.path.exists(filepath):
+                    self.send_response(addr, "ERROR: File nuk ekziston")
+                    return
 
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    content = f.read()
 
             self.send_response(addr, content)
         except Exception as e:
@@ -239,12 +504,14 @@ class UDPServer:
             # Sigurohu që file është brenda FILES_DIR
             filepath = os.path.join(FILES_DIR, filename)
 
-            if not os.path.exists(filepath):
-                self.send_response(addr, "ERROR: File nuk ekziston")
-                return
+            content = self.get_pending_upload(filename)
+            if content is None:
+                if not os.path.exists(filepath):
+                    self.send_response(addr, "ERROR: File nuk ekziston")
+                    return
 
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    content = f.read()
 
             self.send_response(addr, f"DOWNLOAD:{filename}:{content}")
             self.logger.info(f"FILE DOWNLOAD - {addr} downloaded {filename}")
@@ -256,11 +523,21 @@ class UDPServer:
             # Sigurohu që file është brenda FILES_DIR
             filepath = os.path.join(FILES_DIR, filename)
 
-            if not os.path.exists(filepath):
+            # Lock-u siguron që writer-i të mos e rikthejë file-in pas fshirjes
+            with self.upload_lock:
+                pending = self.pending_uploads.get(filename)
+                waiters = self.finish_pending(filename)
+                exists = os.path.exists(filepath)
+                if exists:
+                    os.remove(filepath)
+
+            # Upload-et në pritje u pranuan para fshirjes
+            self.notify_uploaded(filename, waiters)
+
+            if pending is None and not exists:
                 self.send_response(addr, "ERROR: File nuk ekziston")
                 return
 
-            os.remove(filepath)
             self.send_response(addr, "OK: File u fshi")
             self.logger.info(f"FILE DELETE - {addr} deleted {filename}")
         except Exception as e:
@@ -269,7 +546,7 @@ class UDPServer:
     def search_files(self, addr, keyword):
         try:
             results = []
-            for file in os.listdir(FILES_DIR):
+            for file in self.visible_files():
                 if keyword.lower() in file.lower():
                     results.append(file)
 
@@ -285,6 +562,11 @@ class UDPServer:
             # Sigurohu që file është brenda FILES_DIR
             filepath = os.path.join(FILES_DIR, filename)
 
+            # Datat e file-it ekzistojnë vetëm pasi upload-i të jetë shkruar
+            if not self.wait_for_upload(filename):
+                self.send_response(addr, "ERROR: File ende po ruhet, provo përsëri")
+                return
+
             if not os.path.exists(filepath):
                 self.send_response(addr, "ERROR: File nuk ekziston")
                 return
@@ -382,6 +664,8 @@ Data e modifikimit: {modified_time}"""
                     self.running = False
                     print("Serveri po ndalet...")
                     self.logger.info("SERVER STOPPED BY COMMAND")
+                    # Ruaj gjendjen menjëherë, loop-i kryesor mund të presë ende në recvfrom
+                    self.save_state()
                     break
                 elif cmd == 'STATS':
                     # Shfaq stats në terminalin e serverit
@@ -400,6 +684,136 @@ Data e modifikimit: {modified_time}"""
             except Exception as e:
                 print(f"Gabim në input: {e}")
 
+    def build_state(self):
+        """Ndërton gjendjen kompakte të serverit (adresat ruhen si [host, port])"""
+        clients = []
+        for addr, info in list(self.clients.items()):
+            clients.append([addr[0], addr[1], info['connected_at'].isoformat(),
+                            info['messages_received'], info['is_admin'], info['username'],
+                            self.last_activity.get(addr, 0)])
+
+        client_stats = []
+        for addr, stat in list(self.stats['client_stats'].items()):
+            client_stats.append([addr[0], addr[1], stat['messages_received'], stat['bytes_received']])
+
+        return {
+            'version': STATE_VERSION,
+            'stats': {
+                'total_messages_received': self.stats['total_messages_received'],
+                'total_bytes_received': self.stats['total_bytes_received'],
+                'total_bytes_sent': self.stats['total_bytes_sent'],
+                'client_stats': client_stats,
+            },
+            'clients': clients,
+            'admin_client': list(self.admin_client) if self.admin_client else None,
+        }
+
+    def save_state(self):
+        if not self.state_file:
+            return
+
+        try:
+            state = self.build_state()
+            snapshot = json.dumps(state, separators=(',', ':'))
+            # Mos e rishkruaj file-in nëse asgjë nuk ka ndryshuar
+            if snapshot == self.last_snapshot:
+                return
+
+            state['saved_at'] = time.time()
+            data = json.dumps(state, separators=(',', ':'))
+
+            directory = os.path.dirname(os.path.abspath(self.state_file))
+            fd, tmp_path = tempfile.mkstemp(prefix='.state_', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.state_file)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.last_snapshot = snapshot
+        except Exception as e:
+            print(f"Gabim në ruajtjen e gjendjes: {e}")
+
+    def load_state(self):
+        """Rikthen sesionet dhe statistikat nga state_file, kthen numrin e klientëve"""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return 0
+
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') != STATE_VERSION:
+                print(f"Version i panjohur i gjendjes në {self.state_file}, po injorohet")
+                return 0
+
+            # Lexo dhe valido gjithçka para se të ndryshohet gjendja e serverit
+            stats = state['stats']
+            totals = {
+                'total_messages_received': int(stats['total_messages_received']),
+                'total_bytes_received': int(stats['total_bytes_received']),
+                'total_bytes_sent': int(stats['total_bytes_sent']),
+            }
+            saved_at = float(state['saved_at'])
+            clients = {}
+            last_activity = {}
+            for host, port, connected_at, messages, is_admin, username, active in state['clients']:
+                addr = (str(host), int(port))
+                clients[addr] = {
+                    'connected_at': datetime.fromisoformat(connected_at),
+                    'messages_received': int(messages),
+                    'is_admin': bool(is_admin),
+                    'username': str(username)
+                }
+                last_activity[addr] = float(active)
+            client_stats = {}
+            for host, port, messages, received in stats['client_stats']:
+                client_stats[(str(host), int(port))] = {
+                    'messages_received': int(messages),
+                    'bytes_received': int(received)
+                }
+            admin_client = state.get('admin_client')
+            if admin_client:
+                host, port = admin_client
+                admin_client = (str(host), int(port))
+            else:
+                admin_client = None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Gjendja në {self.state_file} nuk mund të lexohet: {e}")
+            return 0
+
+        # Sesionet që kishin kaluar timeout-in para restart-it nuk rikthehen,
+        # përndryshe do të zinin vendet e klientëve të rinj dhe statusin admin
+        now = time.time()
+        self.snapshot_age = max(0.0, now - saved_at)
+        for addr in list(clients):
+            if now - last_activity[addr] > self.timeout:
+                del clients[addr]
+                del last_activity[addr]
+                self.logger.info(f"CLIENT TIMEOUT - {addr}")
+            else:
+                last_activity[addr] = min(last_activity[addr], now)
+        if admin_client not in clients:
+            admin_client = None
+
+        # Numëruesit kumulativë ruhen edhe për klientët e skaduar
+        self.stats.update(totals)
+        self.stats['client_stats'].update(client_stats)
+        self.clients.update(clients)
+        self.last_activity.update(last_activity)
+        self.active_connections = len(self.clients)
+        self.admin_client = admin_client
+
+        self.last_snapshot = json.dumps(self.build_state(), separators=(',', ':'))
+        return len(self.clients)
+
+    def snapshot_loop(self):
+        while self.running:
+            time.sleep(self.snapshot_interval)
+            self.save_state()
+
 
 if __name__ == "__main__":
     server = UDPServer(host='0.0.0.0', port=5678, max_connections=5)